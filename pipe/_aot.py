@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Ahead-of-time compilation of the numba kernels, producing the
+extension module pipe_kernels in the pipe package directory.
+When built, the kernels are used without JIT compilation on first
+call, and without requiring numba at run time. Build with
+
+    python -m pipe._aot
+
+Note that numba.pycc is pending deprecation in numba, and emits a
+NumbaPendingDeprecationWarning. If it is removed, or the module is not
+built, the JIT (or NumPy) versions of the kernels are used instead.
+"""
+
+import os
+from numba.pycc import CC
+from .psf_library import _psf_scores_jit
+
+cc = CC('pipe_kernels')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# The parallel prange loop of the JIT kernel is compiled as a
+# serial loop by pycc
+cc.export('psf_scores', 'f8[:](f8[:], f8[:,:], f8[:])')(_psf_scores_jit.py_func)
+
+
+if __name__ == '__main__':
+    cc.compile()
@@ -0,0 +1,3 @@
+# The ahead-of-time build script requires numba, and is not
+# to be imported when collecting doctests
+collect_ignore = ['_aot.py']
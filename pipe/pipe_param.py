@@ -55,6 +55,9 @@ class PipeParam:
         self.ron = None          # read-out noise in RMS electrons per
                                  # readout and pixel; estimated if not defined
         self.bias = None         # bias in ADU; estimated if not defined
+        self.bias_max_samples = None # If defined, the sigma-clipping levels of the
+                                 # bias estimate are derived from a random subsample
+                                 # of this many bias pixels (faster, less precise)
         self.sa_range = sa_range # tuple of 2 integers: Range of subarray indices to
                                  # be considered. If "None", the full array is used.
         self.mjd2bjd = True      # Use barycentric conversion from MJD to BJD [BUG in astropy 5.1 to be circumvented]
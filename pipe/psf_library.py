@@ -21,8 +21,15 @@ PSF used in the observations.
 """
 
 import os
+import warnings
+from functools import lru_cache
 import numpy as np
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
 # These are the default weights used by the metric, used to define
 # how well PSF parameters match. Format:
 # (xc, yc, Teff, thermFront_2, MJD, exptime)
@@ -55,25 +62,16 @@ class PSF_Library:
     def populate_library(self):
         """Checks all PSF files in the psf_path, extracts parameters
             from the filenames and adds them to a matrix with columns
-            Teff, TF2, exptime, and mjd
+            xc, yc, Teff, TF2, mjd, and exptime
             Returns this matrix and a numpy array of filenames
         """
-        filenames = []
-        
-        for folder in os.listdir(self.psf_ref_path):
-            folder_path = os.path.join(self.psf_ref_path, folder)
-            if os.path.isdir(folder_path):
-                for file in os.listdir(folder_path):
-                    if os.path.isfile(os.path.join(folder_path, file)):
-                        filenames.append(os.path.join(folder, file))
-    
-        np_filenames = np.array(filenames, dtype=object)
-        psf_params = np.zeros((len(np_filenames), 6))
-  
-        for n, filename in enumerate(filenames):
-            psf_params[n] = params_from_filename(filename)
-    
-        return psf_params, np_filenames
+        # The scan is cached and only redone if any of the detector
+        # position folders have been modified
+        folders = tuple((entry.name, entry.stat().st_mtime_ns)
+                        for entry in os.scandir(self.psf_ref_path)
+                        if entry.is_dir())
+        psf_params, np_filenames = scan_library(self.psf_ref_path, folders)
+        return psf_params.copy(), np_filenames.copy()
 
 
     def set_metric_weights(self, weights):
@@ -84,13 +82,16 @@ class PSF_Library:
 
     def compute_scores(self, target_params):
         """Computes the PSF distance metric for all entries in psf_params matrix,
-        given target parameters. Returns the score vector and an sorting index.
+        given target parameters. Returns the score vector.
         """
-        score = np.zeros(len(self.params))
-        for n, psf_entry in enumerate(self.params):
-            score[n] = psf_metric(target_params, psf_entry,
-                                  weights=self.metric_weights)
-        return score
+        if _psf_scores is not None:
+            return _psf_scores(np.ascontiguousarray(target_params, dtype='f8'),
+                               np.ascontiguousarray(self.params, dtype='f8'),
+                               norm_weights(self.metric_weights))
+        # psf_metric is evaluated on the parameter columns, giving
+        # the scores of all entries at once
+        return psf_metric(target_params, self.params.T,
+                          weights=self.metric_weights)
 
 
     def best_matches(self, target_params, min_num=5, score_lim=None):
@@ -99,14 +100,18 @@ class PSF_Library:
         score than score_lim.
         """
         score = self.compute_scores(target_params)
-        ind = np.argsort(score)
-        sort_filenames = self.files[ind]
         if score_lim is None:
             num = min_num
         else:
             num = max(min_num, np.sum(score<score_lim))
         num = min(num, len(self.files))
-        return sort_filenames[:num], score[ind][:num]
+        if 0 < num < len(score):
+            # Only the num best scores need to be sorted
+            ind = np.argpartition(score, num - 1)[:num]
+        else:
+            ind = np.arange(num)
+        ind = ind[np.argsort(score[ind])]
+        return self.files[ind], score[ind]
 
 
     def best_Teff_matches(self, Teff, min_num=5, score_lim=None):
@@ -142,14 +147,38 @@ class PSF_Library:
         os.makedirs(dirname, exist_ok=True)
     
         if serial is None:
-            for serial in range(self.serial_limit):
-                filename = os.path.join(dirname, part1 + '_{:04d}.npy'.format(serial))
-                if not os.path.isfile(filename):
-                    break
+            # List the directory once instead of testing each serial
+            with os.scandir(dirname) as entries:
+                existing = {entry.name for entry in entries
+                            if entry.name.startswith(part1)}
+            serial = next((n for n in range(self.serial_limit)
+                           if part1 + '_{:04d}.npy'.format(n) not in existing),
+                          None)
+            if serial is None:
+                raise ValueError(f'No free serial below {self.serial_limit} '
+                                 f'for PSF file {part1} in {dirname}')
     
         return os.path.join(dirname, part1 + '_{:04d}.npy'.format(serial))
 
 
+@lru_cache(maxsize=8)
+def scan_library(psf_ref_path, folders):
+    """Lists the PSF files in the folders (tuples of folder name and
+    modification time) of psf_ref_path, and extracts their parameters.
+    Returns a matrix of parameters and a numpy array of filenames.
+    """
+    filenames = []
+    for folder, _mtime in folders:
+        with os.scandir(os.path.join(psf_ref_path, folder)) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    filenames.append(os.path.join(folder, entry.name))
+
+    np_filenames = np.array(filenames, dtype=object)
+    psf_params = params_from_filenames(filenames)
+    return psf_params, np_filenames
+
+
 def params_from_filename(filename):
     """Extracts parameters from filename of the format
      {xc}x{yc}/psf_{Teff}K_{TF2}K_{mjd}_{exptime}_{serial}.npy
@@ -165,6 +194,25 @@ def params_from_filename(filename):
     return (xc, yc, Teff, TF2, mjd, exptime)
 
 
+def params_from_filenames(filenames):
+    """Same as params_from_filename, but extracts the parameters
+    from a list of filenames at once. Returns a matrix with one
+    row of parameters (xc, yc, Teff, TF2, mjd, exptime) per file.
+    """
+    if len(filenames) == 0:
+        return np.zeros((0, 6))
+    # Character matrix with one filename per row
+    names = np.array(filenames, dtype='U')
+    chars = names.view('U1').reshape(len(names), -1)
+
+    def field(i0, i1):
+        sub = np.ascontiguousarray(chars[:, i0:i1])
+        return sub.view('U{:d}'.format(i1-i0))[:, 0].astype('f8')
+
+    return np.column_stack((field(0, 3), field(4, 7), field(12, 17),
+                            -field(19, 24), field(26, 31), field(32, 36)))
+
+
 def psf_diff(target_params, psf_params):
     dxc = target_params[0] - psf_params[0]
     dyc = target_params[1] - psf_params[1]
@@ -174,15 +222,25 @@ def psf_diff(target_params, psf_params):
     return (dxc, dyc, dTeff, dTF2, dmjd)
     
 
+def norm_weights(weights):
+    """Normalises the metric weights as used by psf_metric
+    """
+    weights = np.array(weights, dtype='f8')
+    weights /= 0.5*np.sum(weights**2)**.5
+    return weights
+
+
 def psf_metric(target_params, psf_params, weights=DEFAULT_WEIGHTS):
     """Compute a score for the distance between the
     target parameters (xc, yc, Teff, TF2, mjd) and
     PSF parameters (xc, yc, Teff, TF2, mjd, exptime). The
     lower the score, the better the match. The various terms can be 
     customly weighted using the weights parameter. Returns the score.
+    The PSF parameters can also be arrays (e.g. the columns of the
+    library parameter matrix), in which case an array of scores is
+    returned.
     """
-    weights = np.array(weights)
-    weights /= 0.5*np.sum(weights**2)**.5
+    weights = norm_weights(weights)
     
     (dxc, dyc, dTeff, dTF2, dmjd) = psf_diff(target_params, psf_params)
     
@@ -196,3 +254,69 @@ def psf_metric(target_params, psf_params, weights=DEFAULT_WEIGHTS):
     return (wxc**2 + wyc**2 + wTeff**2 + wTF2**2 + wmjd**2 + wexptime**2)**.5
 
 
+_psf_scores = None
+
+if njit is not None:
+    @njit(inline='always')
+    def _ratio(a, b):
+        """Returns a/b, but as NumPy does (inf, or nan for 0/0) when b is
+        zero, independent of the error model the caller is compiled with.
+        """
+        if b == 0:
+            return np.nan if a == 0 else np.inf
+        return a/b
+
+    # Fast math without the no-nans/no-infs assumptions, as scores
+    # can be inf or nan (see _ratio)
+    @njit(parallel=True, cache=True,
+          fastmath={'nsz', 'arcp', 'contract', 'afn', 'reassoc'})
+    def _psf_scores_jit(target, psf_params, w):
+        """Same as psf_metric evaluated for all rows of the psf_params
+        matrix, with already normalised weights w.
+        """
+        n = psf_params.shape[0]
+        out = np.empty(n)
+        for i in prange(n):
+            a = (target[0] - psf_params[i, 0])*w[0]
+            b = (target[1] - psf_params[i, 1])*w[1]
+            c = (_ratio(target[2], psf_params[i, 2]) - 1)*w[2]
+            d = (_ratio(target[3], psf_params[i, 3]) - 1)*w[3]
+            e = ((target[4] - psf_params[i, 4])/1000.0)*w[4]
+            f = (psf_params[i, 5]/60)*w[5]
+            out[i] = (a*a + b*b + c*c + d*d + e*e + f*f)**.5
+        return out
+
+    _psf_scores = _psf_scores_jit
+
+
+
+def _agrees_with_metric(kernel):
+    """Checks that a compiled score kernel gives the same scores as
+    psf_metric on a small probe, which a pipe_kernels module built from
+    an older version of the kernel may not.
+    """
+    target = np.array([512.0, 512.0, 5500.0, -12.0, 59000.0])
+    params = np.array([[500.0, 520.0, 5100.0, -11.5, 58990.0, 60.0],
+                       [300.0, 700.0, 6500.0, -13.0, 59120.0, 4.4]])
+    weights = (1e2, 1e2, 4e3, 1e4, 1.0, 1.0)
+    try:
+        scores = kernel(target, params, norm_weights(weights))
+    except (TypeError, ValueError):
+        return False
+    return np.allclose(scores, psf_metric(target, params.T, weights=weights),
+                       rtol=1e-12, atol=0)
+
+
+# Prefer the ahead-of-time compiled kernel, if built by running
+# python -m pipe._aot, to avoid the JIT compilation on first call. It
+# runs serially, and is only used if it agrees with psf_metric.
+try:
+    from .pipe_kernels import psf_scores as _aot_psf_scores
+except ImportError:
+    pass
+else:
+    if _agrees_with_metric(_aot_psf_scores):
+        _psf_scores = _aot_psf_scores
+    else:
+        warnings.warn('pipe_kernels is out of date and is not used, '
+                      'rebuild it with python -m pipe._aot')
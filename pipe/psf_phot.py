@@ -1189,7 +1189,8 @@ class PsfPhot:
 
         if self.pps.ron is None or self.pps.bias is None:
             self.mess('Reading subarray bias areas')
-            self.bias, self.ron = bias_ron_adu(self.pps.file_sa_raw, gain)
+            self.bias, self.ron = bias_ron_adu(self.pps.file_sa_raw, gain,
+                                               max_samples=self.pps.bias_max_samples)
         else:
             self.mess('Defining bias and read-out noise from input parameters')
             self.ron = self.pps.ron * gain
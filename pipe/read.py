@@ -12,44 +12,68 @@ Also contains routines that save data in fits or text formats.
 """
 
 import os
+from functools import lru_cache
 import numpy as np
-from scipy import interpolate
 from astropy.io import fits
 from astropy.time import Time
 from astropy import units as u
 from astropy import constants as const
-from astropy.coordinates import SkyCoord, get_body_barycentric
+from astropy.coordinates import get_body_barycentric
 from .spline_pca import make_spline2D
 from .pipe_statistics import sigma_clip
 
-# Copy data from fits-files into memory
-fits.Conf.use_memmap = False
+# fitsio is optional, and used for faster reading of columns if installed
+try:
+    import fitsio
+except ImportError:
+    fitsio = None
 
-def raw_datacube(filename, frame_range=None):
+# Light travel time of one astronomical unit, in days
+AU_LIGHT_DAYS = (const.au / const.c).to_value(u.d)
+
+# Floating point type that data cubes are converted to when read. Can be
+# set to float32 by the environment variable PIPE_DTYPE, to halve memory
+# use and bandwidth at the cost of precision.
+DTYPE = np.dtype(os.environ.get('PIPE_DTYPE', 'float64'))
+if not np.issubdtype(DTYPE, np.floating):
+    raise ValueError('PIPE_DTYPE has to be a floating point type, '
+                     'e.g. float32 or float64, not {}'.format(DTYPE))
+
+
+def raw_datacube(filename, frame_range=None, copy=True, dtype=None):
     """Read CHEOPS raw datacube format, either subarray or imagettes.
     Returns cube as numpy array where the first index is frame
     number, an array with the mjd for each frame, the header
     and an associated table with various pre-frame data
     contained in the fits-files, like e.g. the bias values.
     Introduces np.nan values for array elements without data
-    (e.g. outside circular boundary).
+    (e.g. outside circular boundary). If copy is False, the cube
+    is instead returned as a read-only view of the file data, memory
+    mapped unless the data is scaled by BZERO/BSCALE. It is then in
+    the data type and byte order of the file (typically big-endian),
+    and without np.nan values. dtype is the floating point type of the
+    returned cube, by default DTYPE.
     """
+    if frame_range is None:
+        sl = slice(None)
+    else:
+        sl = slice(frame_range[0], frame_range[1])
     with fits.open(filename) as hdul:
-        rawcube = np.array(hdul[1].data, dtype='f8')
-#        np.nan_to_num(rawcube, copy=False)
-        rawcube[rawcube==0] = np.nan
+        if copy:
+            # Only the selected frames are read from file (and scaled, if
+            # BZERO/BSCALE are defined), converted to floating point and
+            # scanned for missing data
+            rawcube = np.array(hdul[1].section[sl], dtype=DTYPE if dtype is None else dtype)
+            rawcube[rawcube==0] = np.nan
+        else:
+            rawcube = hdul[1].data[sl]
+            rawcube.flags.writeable = False
         hdr = hdul[0].header + hdul[1].header
         if len(hdul) < 9: # Imagettes
-            mjd = hdul[2].data['MJD_TIME']
-            tab = hdul[2].data
+            tab = hdul[2].data[sl].copy()
         else:  # Raw subarray file
-            mjd = hdul[9].data['MJD_TIME']
-            tab = hdul[9].data
-    if frame_range is not None:
-        return (rawcube[frame_range[0]:frame_range[1]], 
-               mjd[frame_range[0]:frame_range[1]], 
-               hdr, 
-               tab[frame_range[0]:frame_range[1]])
+            tab = hdul[9].data[sl].copy()
+        mjd = np.array(tab['MJD_TIME'])
     return rawcube, mjd, hdr, tab
 
 
@@ -62,12 +86,20 @@ def lightcurve(filename):
     return lc
 
 
-def fits_cube(filename, level=0):
-    """Reads raw fits cube, returns data (converted to doubles) and header.
-    level is the fits-level of the data, in case of multiple fits layers.
+def fits_cube(filename, level=0, copy=True, dtype=None):
+    """Reads raw fits cube, returns data (converted to doubles, or
+    dtype if defined, by default DTYPE) and header. level is the
+    fits-level of the data, in case of multiple fits layers.
+    If copy is False, the data is instead returned as a read-only view,
+    memory mapped unless the data is scaled by BZERO/BSCALE, in the data
+    type and byte order of the file (typically big-endian).
     """
     with fits.open(filename) as hdul:
-        cube = np.array(hdul[level].data, dtype='f8')
+        if copy:
+            cube = np.array(hdul[level].data, dtype=DTYPE if dtype is None else dtype)
+        else:
+            cube = hdul[level].data
+            cube.flags.writeable = False
         hdr = hdul[level].header.copy()
     return cube, hdr
 
@@ -79,10 +111,13 @@ def nonlinear(filename):
     function that gives correction as a function of ADU.
     """
     nl = np.load(filename)
-    ifun = interpolate.interp1d(nl[:, 0], nl[:, 1], axis=0,
-                                bounds_error=False,
-                                fill_value=(nl[0, 1], nl[-1, 1]))
-    return ifun
+    order = np.argsort(nl[:, 0])
+    xp = np.array(nl[order, 0], dtype='f8')
+    fp = np.array(nl[order, 1], dtype='f8')
+    # Values outside the table are set to the end values of the
+    # table as given in the file
+    left, right = nl[0, 1], nl[-1, 1]
+    return lambda adu: np.interp(adu, xp, fp, left=left, right=right)
 
 
 def attitude(filename):
@@ -90,11 +125,11 @@ def attitude(filename):
     a N-by-4 array with spacecraft mjd, ra, dec, and roll angle.
     """
     with fits.open(filename) as hdul:
-        outparam = np.zeros((hdul[1].header['NAXIS2'], 4))
-        outparam[:, 0] = hdul[1].data['MJD_TIME']
-        outparam[:, 1] = hdul[1].data['SC_RA']
-        outparam[:, 2] = hdul[1].data['SC_DEC']
-        outparam[:, 3] = hdul[1].data['SC_ROLL_ANGLE']
+        data = hdul[1].data
+        outparam = np.column_stack((np.asarray(data['MJD_TIME'], dtype='f8'),
+                                    np.asarray(data['SC_RA'], dtype='f8'),
+                                    np.asarray(data['SC_DEC'], dtype='f8'),
+                                    np.asarray(data['SC_ROLL_ANGLE'], dtype='f8')))
     return outparam
 
 
@@ -102,29 +137,59 @@ def starcat(filename, colstr, entry=0):
     """Reads star catalogue file and returns value for
     column string colstr and entry row
     """
-    with fits.open(filename) as hdul:
-        val = hdul[1].data[colstr][entry]
-    return val
+    return read_columns(filename, 1, [colstr], rows=[entry])[colstr][0]
 
 
 def raw_param(filename, data_index, param_name):
     """Reads the specific sensor from the CHEOPS sa raw file.
+    Only the requested column is read from file.
     """
+    return read_columns(filename, data_index, [param_name])[param_name]
+
+
+def read_columns(filename, ext, columns, rows=None):
+    """Reads the listed columns of the fits table in extension ext,
+    and if rows is a list of indices, only those rows. Uses fitsio if
+    installed, which has less overhead than astropy for small reads.
+    Returns a dict with an array per column, in native byte order so
+    that the result is the same with and without fitsio.
+    """
+    def native(x):
+        return np.array(x, dtype=x.dtype.newbyteorder('='))
+
+    if fitsio is not None:
+        data = fitsio.read(filename, ext=ext, columns=columns, rows=rows)
+        return {col: native(data[col]) for col in columns}
     with fits.open(filename) as hdul:
-        ret_param = np.asarray(hdul[data_index].data[param_name])
-    return ret_param
+        data = hdul[ext].data
+        if rows is None:
+            return {col: native(data.field(col)) for col in columns}
+        return {col: native(data.field(col)[rows]) for col in columns}
 
 
-def bias_ron_adu(filename, gain):
+def bias_ron_adu(filename, gain, max_samples=None):
     """Estimates bias and read-out noise (in electrons) from raw subarray file.
-    gain is in electrons per ADU
+    gain is in electrons per ADU. If max_samples is defined and there are
+    more bias pixels, the iterative sigma-clipping levels are estimated
+    from a reproducible random subsample of max_samples pixels, and then
+    applied to all pixels. This saves the repeated medians over all pixels,
+    at the cost of less precise clipping levels; bias and read-out noise
+    are still computed from all non-clipped pixels. Since the pixel values
+    are integers, the median bias can then shift by a fraction of an ADU.
     """
     with fits.open(filename) as hdul:
         nexp = hdul[1].header['NEXP']
         bias_pix = gain*np.array(hdul[2].data.flat, dtype='f8')
+    if max_samples is None or len(bias_pix) <= max_samples:
         sel = sigma_clip(bias_pix, clip=3, niter=10)
-        bias = np.nanmedian(bias_pix[sel])/nexp
-        ron = np.nanstd(bias_pix[sel])/nexp**.5
+    else:
+        rng = np.random.default_rng(0)
+        sample = bias_pix[rng.choice(len(bias_pix), max_samples, replace=False)]
+        ssel = sigma_clip(sample, clip=3, niter=10)
+        sel = (np.abs(bias_pix - np.nanmedian(sample[ssel])) <=
+               3*np.nanstd(sample[ssel]))
+    bias = np.nanmedian(bias_pix[sel])/nexp
+    ron = np.nanstd(bias_pix[sel])/nexp**.5
     return bias, ron
 
 
@@ -169,29 +234,30 @@ def gain(file_hk, file_gain):
         exp_vss = data['EXP_VSS']
         exp_temp = data['EXP_TEMP']
 
-    gain_vec = gain_nom * (1 + np.sum(gain_fact[None, :] *
-                                      (volt_vss[:, None] - vss_off) ** exp_vss[
-                                                                       None,
-                                                                       :] *
-                                      (volt_vod[:, None] - volt_vss[:,
-                                                           None] - vod_off) ** exp_vod[
-                                                                               None,
-                                                                               :] *
-                                      (volt_vrd[:, None] - volt_vss[:,
-                                                           None] - vrd_off) ** exp_vrd[
-                                                                               None,
-                                                                               :] *
-                                      (volt_vog[:, None] - volt_vss[:,
-                                                           None] - vog_off) ** exp_vog[
-                                                                               None,
-                                                                               :] *
-                                      (temp_ccd[:,
-                                       None] + temp_off) ** exp_temp[None, :],
-                                      axis=1))
+    # Offset voltages and temperature, computed once per HK sample
+    dvss = np.asarray(volt_vss - vss_off, dtype='f8')
+    dvod = np.asarray(volt_vod - volt_vss - vod_off, dtype='f8')
+    dvrd = np.asarray(volt_vrd - volt_vss - vrd_off, dtype='f8')
+    dvog = np.asarray(volt_vog - volt_vss - vog_off, dtype='f8')
+    dtemp = np.asarray(temp_ccd + temp_off, dtype='f8')
+
+    terms = poly_terms(dvss, exp_vss)
+    terms *= poly_terms(dvod, exp_vod)
+    terms *= poly_terms(dvrd, exp_vrd)
+    terms *= poly_terms(dvog, exp_vog)
+    terms *= poly_terms(dtemp, exp_temp)
+    gain_vec = gain_nom * (1 + np.einsum('k,nk->n', gain_fact, terms))
 
     return mjd, 1 / gain_vec
 
 
+def poly_terms(x, exponents):
+    """Helper function to gain that returns the matrix
+    x[:, None]**exponents[None, :]
+    """
+    return np.power(x[:, None], np.asarray(exponents)[None, :])
+
+
 def thermFront_2(filename):
     """Reads frontTemp_2 sensor data from the CHEOPS raw file.
     """
@@ -205,13 +271,26 @@ def mjd2bjd(mjd, ra, dec):
     mjd can be an array of MJD dates. ra and dec in degrees.
     """
     t = Time(mjd, format='mjd')
-    r = get_body_barycentric('earth', t)
-    n = SkyCoord(ra=ra*u.degree, dec=dec*u.degree, frame='icrs').cartesian
+    r = get_body_barycentric('earth', t).xyz.to_value(u.au)
+    n = sky_direction(float(ra), float(dec))
     
-    bjd = mjd + 2400000.5 + (n.dot(r)/const.c).to_value(u.d)
+    bjd = mjd + 2400000.5 + AU_LIGHT_DAYS * (n @ r)
     return bjd
 
 
+@lru_cache(maxsize=None)
+def sky_direction(ra, dec):
+    """Returns the (read-only, as it is cached) unit vector (ICRS
+    cartesian) of direction given in degrees by ra and dec
+    """
+    ra_rad, dec_rad = np.deg2rad(ra), np.deg2rad(dec)
+    n = np.array([np.cos(dec_rad)*np.cos(ra_rad),
+                  np.cos(dec_rad)*np.sin(ra_rad),
+                  np.sin(dec_rad)])
+    n.flags.writeable = False
+    return n
+
+
 def sub_image_indices(offset, shape):
     """Helper function that computes index ranges
     given a 2D offset and a 2D shape
@@ -230,13 +309,17 @@ def flatfield(filename, Teff, offset, shape):
     by the offset and size (in 2D pixel coordinates).
     """
     with fits.open(filename) as hdul:
-        T = hdul[2].data['T_EFF']
-        T = T[hdul[2].data['DATA_TYPE'] == 'FLAT FIELD']
-        idx = np.searchsorted(T, Teff, side="left")
-        a = (Teff - T[idx]) / (T[idx + 1] - T[idx])
+        T_all = np.asarray(hdul[2].data['T_EFF'])
+        layers = np.flatnonzero(hdul[2].data['DATA_TYPE'] == 'FLAT FIELD')
+        # The table need not be sorted in temperature
+        order = np.argsort(T_all[layers])
+        T = T_all[layers][order]
+        idx = np.clip(np.searchsorted(T, Teff, side="left"), 1, len(T) - 1)
+        a = (Teff - T[idx - 1]) / (T[idx] - T[idx - 1])
         i0, i1, j0, j1 = sub_image_indices(offset, shape)
-        ff0 = hdul[1].data[idx, j0:j1, i0:i1]
-        ff1 = hdul[1].data[idx + 1, j0:j1, i0:i1]
+        # Only read the two bracketing flatfield layers from file
+        ff0 = hdul[1].section[layers[order[idx - 1]], j0:j1, i0:i1]
+        ff1 = hdul[1].section[layers[order[idx]], j0:j1, i0:i1]
     return ff0 * (1 - a) + ff1 * a
 
 
@@ -264,35 +347,56 @@ def find_brack_ind(data, v):
     return n0, n1
 
 
+def find_ref_files(refpath, filetype):
+    """Traverses refpath directory, looking for all reference
+    files with filetype (e.g. 'REF_APP_DarkFrame') in the name.
+    Returns list of filenames and array of their validity start
+    times in MJD.
+    """
+    reffiles = []; mjds = []
+    for root, _dirs, files in os.walk(refpath):
+        for file in files:
+            if filetype in file:
+                filename = os.path.join(root, file)
+                reffiles.append(filename)
+                mjds.append(ref_start_mjd(filename,
+                                          os.stat(filename).st_mtime_ns))
+    return reffiles, np.array(mjds)
+
+
+@lru_cache(maxsize=None)
+def ref_start_mjd(filename, mtime):
+    """Reads the validity start time V_STRT_U of reference file
+    and returns it in MJD. Cached, so that each file is only opened
+    once (or again if its modification time mtime changes).
+    """
+    with fits.open(filename) as hdul:
+        return Time(hdul[1].header['V_STRT_U'],
+                    scale='tt', format='isot').tt.mjd
+
+
 def dark(darkpath, mjd, offset, shape):
     """Traverses darkpath directory, looking for all
     dark current files and interpolates the two 
     closest in time.
     """
-    darkfiles = []; mjds = []
-    for root, _dirs, files in os.walk(darkpath):
-        for file in files:
-            if 'REF_APP_DarkFrame' in file:
-                filename = os.path.join(root, file)
-                darkfiles.append(filename)
-                with fits.open(filename) as hdul:
-                    mjds.append(Time(hdul[1].header['V_STRT_U'],
-                                scale='tt', format='isot').tt.mjd)
+    darkfiles, mjds = find_ref_files(darkpath, 'REF_APP_DarkFrame')
     if len(mjds) < 1:
         raise ValueError('Missing dark frame reference file. You may turn off '
                          'this feature by setting `pps.darksub = False`.')
     
-    n0, n1 = find_brack_ind(np.array(mjds), mjd)
+    n0, n1 = find_brack_ind(mjds, mjd)
     i0, i1, j0, j1 = sub_image_indices(offset, shape)
 
+    # Only read the requested part of the dark frames from file
     with fits.open(darkfiles[n0]) as hdul:
-        dark0 = hdul[1].data[0, j0:j1, i0:i1].copy()
-        dark_err0 = hdul[1].data[1, j0:j1, i0:i1].copy()
+        dark0 = hdul[1].section[0, j0:j1, i0:i1]
+        dark_err0 = hdul[1].section[1, j0:j1, i0:i1]
     if n0 == n1:
         return dark0, dark_err0, darkfiles[n0], darkfiles[n1]
     with fits.open(darkfiles[n1]) as hdul:
-        dark1 = hdul[1].data[0, j0:j1, i0:i1].copy()
-        dark_err1 = hdul[1].data[1, j0:j1, i0:i1].copy()
+        dark1 = hdul[1].section[0, j0:j1, i0:i1]
+        dark_err1 = hdul[1].section[1, j0:j1, i0:i1]
 
     t = (mjd-mjds[n0])/(mjds[n1]-mjds[n0])
     dark = (1-t)*dark0 + t*dark1
@@ -305,24 +409,16 @@ def bad(badpath, mjd, offset, shape):
     bad pixel map current files and selects the nearest
     in time.
     """
-    badfiles = []; mjds = []
-    for root, _dirs, files in os.walk(badpath):
-        for file in files:
-            if 'REF_APP_BadPixelMap' in file:
-                filename = os.path.join(root, file)
-                badfiles.append(filename)
-                with fits.open(filename) as hdul:
-                    mjds.append(Time(hdul[1].header['V_STRT_U'],
-                                scale='tt', format='isot').tt.mjd)
+    badfiles, mjds = find_ref_files(badpath, 'REF_APP_BadPixelMap')
     if len(mjds) < 1:
         raise ValueError('Missing bad pixel map reference file. You may turn off '
                          'this feature by setting `pps.mask_badpix = False`.')
     
-    n = np.argmin(np.abs(mjd-np.array(mjds)))
+    n = np.argmin(np.abs(mjd-mjds))
 
     i0, i1, j0, j1 = sub_image_indices(offset, shape)
     with fits.open(badfiles[n]) as hdul:
-        bad = hdul[1].data[j0:j1, i0:i1].copy()
+        bad = hdul[1].section[j0:j1, i0:i1]
     return bad, badfiles[n]
 
 
@@ -331,11 +427,13 @@ def imagette_offset(filename, frame_range=None):
     imagette fits-file cube; first offset is relative
     to full array, second offset is relative to subarray
     """
-    with fits.open(filename) as hdul:
-        x_off = hdul[2].data['X_OFF_FULL_ARRAY'][0]
-        y_off = hdul[2].data['Y_OFF_FULL_ARRAY'][0]
-        x_sa_off = hdul[2].data['X_OFF_SUB_ARRAY'][0]
-        y_sa_off = hdul[2].data['Y_OFF_SUB_ARRAY'][0]
+    offs = read_columns(filename, 2, ['X_OFF_FULL_ARRAY', 'Y_OFF_FULL_ARRAY',
+                                      'X_OFF_SUB_ARRAY', 'Y_OFF_SUB_ARRAY'],
+                        rows=[0])
+    x_off = offs['X_OFF_FULL_ARRAY'][0]
+    y_off = offs['Y_OFF_FULL_ARRAY'][0]
+    x_sa_off = offs['X_OFF_SUB_ARRAY'][0]
+    y_sa_off = offs['Y_OFF_SUB_ARRAY'][0]
     return (x_off, y_off), (x_sa_off, y_sa_off)
     # raise Exception('[imagette_offset] Error: {:s} not found'.format(filename))
 
@@ -353,13 +451,11 @@ def save_bg_star_phot_fits(filename, t, bjd, fluxes, gaia_IDs, header):
     arguments, to fits table in binary format. The stars are identified by 
     their Gaia ID numbers in the comment for respective fits-column
     """
-    c = []
-    c.append(fits.Column(name='MJD_TIME', format='D', unit='day', array=t))
-    c.append(fits.Column(name='BJD_TIME', format='D', unit='day', array=bjd))
+    c = [('MJD_TIME', 'f8', 'day', t),
+         ('BJD_TIME', 'f8', 'day', bjd)]
     for n in range(fluxes.shape[1]):
-        c.append(fits.Column(name='f{:d}'.format(n), format='D', unit='electrons',
-                             array=fluxes[:, n]))
-    tab = fits.BinTableHDU.from_columns(c, header=header)
+        c.append(('f{:d}'.format(n), 'f8', 'electrons', fluxes[:, n]))
+    tab = table_hdu(c, header=header)
     for n in range(fluxes.shape[1]):
         key = f'TTYPE{n+3}'
         tab.header[key] = (tab.header[key], f'{gaia_IDs[n]}')
@@ -373,21 +469,19 @@ def save_eigen_fits(filename, t, bjd, sc, err, bg, roll, xc, yc, flag,
     analysis are also added, as well as the thermFront_2 values, to be
     used in de-correlations.
     """
-    c = []
-    c.append(fits.Column(name='MJD_TIME', format='D', unit='day', array=t))
-    c.append(fits.Column(name='BJD_TIME', format='D', unit='day', array=bjd))
-    c.append(fits.Column(name='FLUX', format='D', unit='electrons', array=sc))
-    c.append(
-        fits.Column(name='FLUXERR', format='D', unit='electrons', array=err))
-    c.append(fits.Column(name='BG', format='D', unit='electrons/pix', array=bg))
-    c.append(fits.Column(name='ROLL', format='D', unit='deg', array=roll))
-    c.append(fits.Column(name='XC', format='D', unit='pix', array=xc))
-    c.append(fits.Column(name='YC', format='D', unit='pix', array=yc))
-    c.append(fits.Column(name='FLAG', format='I', array=flag))
+    c = [('MJD_TIME', 'f8', 'day', t),
+         ('BJD_TIME', 'f8', 'day', bjd),
+         ('FLUX', 'f8', 'electrons', sc),
+         ('FLUXERR', 'f8', 'electrons', err),
+         ('BG', 'f8', 'electrons/pix', bg),
+         ('ROLL', 'f8', 'deg', roll),
+         ('XC', 'f8', 'pix', xc),
+         ('YC', 'f8', 'pix', yc),
+         ('FLAG', 'i2', None, flag)]
     for n in range(w.shape[1]):
-        c.append(fits.Column(name='U{:d}'.format(n), format='D', array=w[:, n]))
-    c.append(fits.Column(name='thermFront_2', format='D', array=thermFront_2))
-    tab = fits.BinTableHDU.from_columns(c, header=header)
+        c.append(('U{:d}'.format(n), 'f8', None, w[:, n]))
+    c.append(('thermFront_2', 'f8', None, thermFront_2))
+    tab = table_hdu(c, header=header)
     tab.writeto(filename, overwrite=True, checksum=True)
 
 
@@ -400,36 +494,55 @@ def save_binary_eigen_fits(filename, t, bjd, sc0, sc1, bg, roll,
     also added, as well as the thermFront_2 values, to be used in
     de-correlations.
     """
-    c = []
-    c.append(fits.Column(name='MJD_TIME', format='D', unit='day', array=t))
-    c.append(fits.Column(name='BJD_TIME', format='D', unit='day', array=bjd))
-    c.append(fits.Column(name='FLUX0', format='D', unit='electrons', array=sc0))
-    c.append(fits.Column(name='FLUX1', format='D', unit='electrons', array=sc1))
-    c.append(fits.Column(name='BG', format='D', unit='electrons/pix', array=bg))
-    c.append(fits.Column(name='ROLL', format='D', unit='deg', array=roll))
-    c.append(fits.Column(name='XC0', format='D', unit='pix', array=xc0))
-    c.append(fits.Column(name='YC0', format='D', unit='pix', array=yc0))
-    c.append(fits.Column(name='XC1', format='D', unit='pix', array=xc1))
-    c.append(fits.Column(name='YC1', format='D', unit='pix', array=yc1))
-    c.append(fits.Column(name='FLAG', format='I', array=flag))
+    c = [('MJD_TIME', 'f8', 'day', t),
+         ('BJD_TIME', 'f8', 'day', bjd),
+         ('FLUX0', 'f8', 'electrons', sc0),
+         ('FLUX1', 'f8', 'electrons', sc1),
+         ('BG', 'f8', 'electrons/pix', bg),
+         ('ROLL', 'f8', 'deg', roll),
+         ('XC0', 'f8', 'pix', xc0),
+         ('YC0', 'f8', 'pix', yc0),
+         ('XC1', 'f8', 'pix', xc1),
+         ('YC1', 'f8', 'pix', yc1),
+         ('FLAG', 'i2', None, flag)]
     for n in range(w0.shape[1]):
-        c.append(
-            fits.Column(name='U{:d}'.format(n), format='D', array=w0[:, n]))
+        c.append(('U{:d}'.format(n), 'f8', None, w0[:, n]))
     for n in range(w1.shape[1]):
-        c.append(
-            fits.Column(name='W{:d}'.format(n), format='D', array=w1[:, n]))
-    c.append(fits.Column(name='thermFront_2', format='D', array=thermFront_2))
-    tab = fits.BinTableHDU.from_columns(c, header=header)
+        c.append(('W{:d}'.format(n), 'f8', None, w1[:, n]))
+    c.append(('thermFront_2', 'f8', None, thermFront_2))
+    tab = table_hdu(c, header=header)
     tab.writeto(filename, overwrite=True, checksum=True)
 
 
+def table_hdu(columns, header):
+    """Produces a binary table HDU from a list of columns defined
+    as (name, dtype, unit, array). The columns are filled into a
+    single structured array that is used as table data.
+    """
+    rec = np.empty(len(columns[0][3]),
+                   dtype=[(name, dtype) for name, dtype, _unit, _arr in columns])
+    for name, _dtype, _unit, arr in columns:
+        rec[name] = arr
+    tab = fits.BinTableHDU(rec, header=header)
+    for n, (_name, _dtype, unit, _arr) in enumerate(columns):
+        if unit is not None:
+            tab.columns[n].unit = unit
+    return tab
+
+
 def save_txt(filename, t, flux, err, bg, roll, xc, yc):
     """Save lightcurve to textfile according to arrays
     defined by arguments
     """
     X = np.array([t, flux, err, bg, roll, xc, yc]).T
-    fmt = '%26.18e'
-    np.savetxt(filename, X=X, fmt=fmt)
+    # Same format as np.savetxt with fmt='%26.18e', but formatted in
+    # chunks of rows at a time instead of row by row
+    row_fmt = ' '.join(X.shape[1] * ['%26.18e']) + '\n'
+    chunk = 1024
+    with open(filename, 'w') as fp:
+        for n in range(0, len(X), chunk):
+            rows = X[n:n+chunk]
+            fp.write(len(rows) * row_fmt % tuple(rows.ravel()))
 
 
 def save_psf_filenames(filename, psf_filenames):
@@ -8,7 +8,8 @@ Module with the star_bg class and methods to use the catalog file of background
 stars (retrieved from Gaia) to produce synthetic images of the field of view
 observed by CHEOPS, using an empirical PSF.
 """
-from functools import partial
+import math
+from functools import partial, lru_cache
 import numpy as np
 from astropy.io import fits
 from .psf_model import psf_model
@@ -16,20 +17,40 @@ from .read import PSFs as load_PSFs
 from .spline_pca import SplinePCA
 from .psf import fit as psf_fit
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 class WorkCat:
     """Data class for processed catalog data for a single frame that are
     relevantfor producing a star background.
     """
-    def __init__(self, x, y, fscale, dxs, dys, star_radii):
+    def __init__(self, x, y, fscale, dxs, dys, nsamp, star_radii):
         self.catsize = len(x)
         self.x = x                          # Detector coordinate in frame, one entry per star
         self.y = y                          # (roll rotated, target jitter offset)
         self.fscale = fscale                # Flux relative to target, one entry per star
-        self.rad = star_radii                 # Defined PSF radius of star
-        self.dxs = dxs  # List of arrays, containing offsets of PSFs per star
-        self.dys = dys  # List of arrays, containing offsets of PSFs per star
+        self.rad = np.asarray(star_radii, dtype='int') # Defined PSF radius of star
+        self.dxs = dxs  # Array (star, sample) of offsets of PSFs, padded with zeros
+        self.dys = dys  # Array (star, sample) of offsets of PSFs, padded with zeros
+        self.nsamp = nsamp                  # Number of offset samples per star
         self.coeff = self.catsize*[None]    # List of coefficients for composite PSF
+        self._dist = {}                     # Cached distances to points
+
+    def dist_to(self, cx, cy):
+        """Returns the distances of all stars to the pixel
+        coordinate (cx, cy), cached per coordinate.
+        """
+        if (cx, cy) not in self._dist:
+            self._dist[(cx, cy)] = ((self.x - cx)**2 + (self.y - cy)**2)**0.5
+        return self._dist[(cx, cy)]
+
+    def offsets(self, n):
+        """Returns the PSF offsets dxs, dys of star n
+        """
+        return self.dxs[n,:self.nsamp[n]], self.dys[n,:self.nsamp[n]]
 
 
 class star_bg:
@@ -47,6 +68,8 @@ class star_bg:
         self.xpos, self.ypos, self.fscale, self.star_radii, self.Teff, self.gaiaID = \
             self.read_starcat(starcatfile, maxrad=maxrad, fscalemin=fscalemin)
         self.catsize = len(self.fscale)
+        self.dist2 = self.xpos**2 + self.ypos**2
+        self.dist = np.sqrt(self.dist2)
         self.psf_ids, self.psfs = self.assign_psf()
 
 
@@ -55,19 +78,20 @@ class star_bg:
         of the temperatures in the limited list psf_mod_Teff. An index to
         this list is then estimated for each catalogued background star, using 
         the nearest match to the catalogued temperature (and a default index
-        if no temperature is available).
+        if no temperature is available). Only PSFs referenced by some star
+        (and the default PSF) are produced, the others are left as None.
         """
-        psf_ids = self.default_psf_id * np.ones(self.catsize, dtype='int')
-        psfs = []
-
-        for Teff in self.psf_mod_Teff:
-            psf_files = self.psf_lib.best_Teff_matches(Teff, min_num=10)
+        diff = np.absolute(self.psf_mod_Teff[None,:] - self.Teff[:,None])
+        psf_ids = np.where(np.isfinite(self.Teff), diff.argmin(axis=1),
+                           self.default_psf_id).astype('int')
+
+        needed = set(psf_ids.tolist()) | {self.default_psf_id}
+        psfs = len(self.psf_mod_Teff)*[None]
+        for n in sorted(needed):
+            psf_files = self.psf_lib.best_Teff_matches(self.psf_mod_Teff[n], min_num=10)
             psf_list = load_PSFs(psf_files, self.psf_lib.psf_ref_path)
             spca = SplinePCA(psf_list, num_eigen=1)
-            psfs.append(psf_model(spca.get_median_spline()))
-        for n in range(self.catsize):
-            if np.isfinite(self.Teff[n]):
-                psf_ids[n] = np.absolute(self.psf_mod_Teff-self.Teff[n]).argmin()
+            psfs[n] = psf_model(spca.get_median_spline())
         return psf_ids, psfs
 
 
@@ -83,20 +107,27 @@ class star_bg:
             else:
                 N = np.searchsorted(cat['distance'], maxrad)
             if 'MAG_CHEOPS' in hdul[1].columns.names:
-                fscale = 10**(-0.4*(cat['MAG_CHEOPS'][:N] - cat['MAG_CHEOPS'][0]))
+                mag = np.asarray(cat['MAG_CHEOPS'][:N])
             elif 'MAG_GAIA' in hdul[1].columns.names: # Name change in DRP v13
-                fscale = 10**(-0.4*(cat['MAG_GAIA'][:N] - cat['MAG_GAIA'][0]))
+                mag = np.asarray(cat['MAG_GAIA'][:N])
             else:
                 raise Exception(f'[read_starcat] Error: magnitude column not defined')
-
-            dx = ((cat['RA'][0]-cat['RA'][:N]) * 
-                   np.cos(np.deg2rad(cat['DEC'][0])) * 3600.0 / self.pxl_scl)
-            dy = ((cat['DEC'][:N]-cat['DEC'][0]) * 3600.0 / self.pxl_scl)
+            fscale = 10**(-0.4*(mag - mag[0]))
+
+            ra = np.asarray(cat['RA'][:N], dtype=np.float64)
+            dec = np.asarray(cat['DEC'][:N], dtype=np.float64)
+            cos_dec0 = math.cos(math.radians(dec[0]))
+            dx = np.subtract(ra[0], ra)
+            dx *= cos_dec0 * 3600.0 / self.pxl_scl
+            dy = np.subtract(dec, dec[0])
+            dy *= 3600.0 / self.pxl_scl
             Teff = cat['T_EFF'][:N]
             gaiaID = cat['ID'][:N]
             sel = fscale > fscalemin
-            star_rads = psf_radii(fscale[sel]*self.star_rad_scale)
-            return dx[sel], dy[sel], fscale[sel], star_rads, Teff[sel], gaiaID[sel]
+            dx, dy, fscale, Teff, gaiaID = (np.compress(sel, a)
+                                            for a in (dx, dy, fscale, Teff, gaiaID))
+            star_rads = psf_radii(fscale*self.star_rad_scale)
+            return dx, dy, fscale, star_rads, Teff, gaiaID
 
         
     def rotate_cat(self, rolldeg, maxrad=None):
@@ -105,8 +136,7 @@ class star_bg:
         new relative rotated pixel coordinates (dx, dy).
         """
         if maxrad is not None:
-            r = (self.xpos**2+self.ypos**2)**.5 
-            sel = (r <= (maxrad + self.star_radii))
+            sel = (self.dist <= (maxrad + self.star_radii))
             return rotate_position(self.xpos[sel], self.ypos[sel], rolldeg)
         return rotate_position(self.xpos, self.ypos, rolldeg)
 
@@ -124,31 +154,21 @@ class star_bg:
         than limflux and closer than outradius 
         (and outside of inradius) to target
         """
-        dist = (self.xpos**2 + self.ypos**2)**.5
-        ids = []
-        for n in range(self.catsize):
-            if self.fscale[n] < limflux:
-                continue
-            if dist[n] < inradius:
-                continue
-            if dist[n] > outradius:
-                break
-            ids.append(n)
-        return ids
-
-
-    def image(self, x0, y0, rolldeg, shape, skip=[0], limflux=0,
-              single_id=None):
-        """Produces image with background stars at defined roll angle.
-        skip is a list of entries to be skipped. limflux is at what fractional
-        flux of the target background stars should be ignored. The single_id is
-        to select and draw an image of the selected star only.
-        """        
+        sel = ((self.fscale >= limflux) &
+               (self.dist2 >= inradius**2) &
+               (self.dist2 <= outradius**2))
+        return np.flatnonzero(sel).tolist()
+
+
+    def star_patches(self, x0, y0, rolldeg, shape, skip=[0], limflux=0,
+                     single_id=None):
+        """Iterates over the stars to be drawn in an image of the defined
+        shape, see image(). For each star yields the PSF patch, its detector
+        offset (i0, j0) and pixel coordinates ddx, ddy relative to the star,
+        the squared PSF radius and the flux.
+        """
         dx, dy = self.rotate_cat(rolldeg)
-        
-        xcoo = np.arange(shape[1]) - x0
-        ycoo = np.arange(shape[0]) - y0
-        ret_img = np.zeros(shape)
+        skip_set = frozenset(skip)
         
         if single_id is None:
             id_range = range(self.catsize)
@@ -156,25 +176,38 @@ class star_bg:
             id_range = [single_id]
         
         for n in id_range:
-            if n in skip: continue
+            if n in skip_set: continue
             # Skip faint stars
             if self.fscale[n] < limflux: continue
             
-            inds = find_area_inds(x0 + dx[n], y0 + dy[n], shape=shape, radius=self.star_radii[n])
+            xc, yc = x0 + dx[n], y0 + dy[n]
+            inds = find_area_inds(xc, yc, shape=shape, radius=self.star_radii[n])
             if inds is None:
                 continue
             else:
                 i0, i1, j0, j1 = inds
 
-            ddx = xcoo[i0:i1] - dx[n]
-            ddy = ycoo[j0:j1] - dy[n]
+            ddx = np.arange(i0, i1, dtype=np.float64) - xc
+            ddy = np.arange(j0, j1, dtype=np.float64) - yc
             psf_fun = self.psfs[self.psf_ids[n]]
             psf_mat = psf_fun(ddx, ddy)
             if psf_mat.ndim == 1:
                 psf_mat = np.reshape(psf_mat, (1, len(psf_mat)))            
-            xmat,ymat = np.meshgrid(ddx,ddy)
-            psf_mat[xmat**2+ymat**2 > self.star_radii[n]**2] = 0
-            ret_img[j0:j1,i0:i1] += self.fscale[n] * psf_mat
+            yield (psf_mat, i0, j0, ddx, ddy,
+                   float(self.star_radii[n]**2), float(self.fscale[n]))
+
+
+    def image(self, x0, y0, rolldeg, shape, skip=[0], limflux=0,
+              single_id=None):
+        """Produces image with background stars at defined roll angle.
+        skip is a list of entries to be skipped. limflux is at what fractional
+        flux of the target background stars should be ignored. The single_id is
+        to select and draw an image of the selected star only.
+        """        
+        ret_img = np.zeros(shape)
+        for patch in self.star_patches(x0, y0, rolldeg, shape, skip=skip,
+                                       limflux=limflux, single_id=single_id):
+            add_masked_patch(ret_img, *patch)
         return ret_img
 
 
@@ -188,33 +221,33 @@ class star_bg:
         Nstars = len(x)
         fscale = self.fscale[:Nstars].copy()
         star_radii = self.star_radii[:Nstars].copy()
-        dxs = []
-        dys = []
 
         r = (x**2+y**2)**.5
         num_res = 0.5*np.deg2rad(blurdeg)*r/resolution
-        for n in range(Nstars):
-            N = 2*int(num_res[n])+1
-            if N > 2:
-                angles_deg = 0.5*blurdeg*np.linspace(-1, 1, N)
-                rx, ry = rotate_position(x[n], y[n], angles_deg)
-                dxs.append(rx-x[n])
-                dys.append(ry-y[n])
-            else:
-                dxs.append(np.zeros(1))
-                dys.append(np.zeros(1))
+        nsamp = 2*num_res.astype('int')+1
+        dxs = np.zeros((Nstars, np.max(nsamp, initial=1)))
+        dys = np.zeros_like(dxs)
+        # Rotate all stars with the same number of blur samples at once
+        for N in np.unique(nsamp[nsamp > 2]):
+            idx = np.flatnonzero(nsamp == N)
+            angles_deg = 0.5*blurdeg*np.linspace(-1, 1, N)
+            rx, ry = rotate_position(x[idx,None], y[idx,None], angles_deg)
+            dxs[idx,:N] = rx - x[idx,None]
+            dys[idx,:N] = ry - y[idx,None]
 
         return WorkCat(x=x+x0, y=y+y0, fscale=fscale,
-                 dxs=dxs, dys=dys, star_radii=star_radii)
+                 dxs=dxs, dys=dys, nsamp=nsamp, star_radii=star_radii)
 
 
     def smear(self, x0, y0, rolldeg, shape, limflux=1e-2):
         """Computes the smearing trail for all stars, including target.
         Returns a 1D array that can then be properly expanded to a 1D image.
         """
-        im = self.image(x0, y0, rolldeg, shape=shape,
-                        skip=[], limflux=limflux)
-        return np.sum(im, axis=0)
+        trail = np.zeros(shape[1])
+        for patch in self.star_patches(x0, y0, rolldeg, shape=shape,
+                                       skip=[], limflux=limflux):
+            add_masked_columns(trail, *patch)
+        return trail
 
 
 def refine_bg_model(starids, data_frame, noise, mask, model, psf_norm,
@@ -234,11 +267,11 @@ def refine_bg_model(starids, data_frame, noise, mask, model, psf_norm,
         fit_frame = data_frame - model
 #        psf_smear = partial(multi_psf, psf_mod=psf_mod,
 #                            dxs=work_cat.dxs[star_id], dys=work_cat.dys[star_id])
-        psf_smear = MultiPSF(psf_mod=psf_mod, dxs=work_cat.dxs[star_id],
-                             dys=work_cat.dys[star_id])
+        dxs, dys = work_cat.offsets(star_id)
+        psf_smear = MultiPSF(psf_mod=psf_mod, dxs=dxs, dys=dys)
         psf_rad = work_cat.rad[star_id]
-        dist = ((work_cat.x[star_id] - 0.5*data_frame.shape[1])**2 + 
-                (work_cat.y[star_id] - 0.5*data_frame.shape[0])**2)**0.5
+        dist = work_cat.dist_to(0.5*data_frame.shape[1],
+                                0.5*data_frame.shape[0])[star_id]
         if dist > 0.5*np.min(data_frame.shape):
             fitrad = psf_rad
         else:
@@ -273,8 +306,9 @@ def make_bg_circ_mask(shape, work_cat, skip=[0], radius=20):
     work_cat). Returns produced frame according to shape.
     """
     frame = np.zeros(shape)
+    skip_set = frozenset(skip)
     for n in range(work_cat.catsize):
-        if n in skip:
+        if n in skip_set:
             continue
         add_circle(frame,
                 work_cat.x[n],
@@ -292,8 +326,9 @@ def make_bg_psf_mask(shape, work_cat, psf_ids, psfs, skip=[0], kx=None, ky=None,
     work_cat). Returns produced frame according to shape.
     """
     frame = np.zeros(shape)
+    skip_set = frozenset(skip)
     for n in range(work_cat.catsize):
-        if n in skip:
+        if n in skip_set:
             continue
         if kx is not None and work_cat.coeff[n] is not None:
             kmat = (work_cat.coeff[n], kx, ky)
@@ -302,8 +337,7 @@ def make_bg_psf_mask(shape, work_cat, psf_ids, psfs, skip=[0], kx=None, ky=None,
         add_psf_mask(frame,
                 work_cat.x[n],
                 work_cat.y[n],
-                work_cat.dxs[n],
-                work_cat.dys[n],
+                *work_cat.offsets(n),
                 psfs[psf_ids[n]],
                 kmat=kmat,
                 radius=radius,
@@ -319,10 +353,10 @@ def make_bg_frame(shape, work_cat, psf_ids, psfs, skip=[0], kx=None, ky=None):
     star entries (those that then have coefficients defined in
     work_cat). Returns produced frame according to shape.
     """
-    radii = np.array(work_cat.rad, dtype='int')
     frame = np.zeros(shape)
+    skip_set = frozenset(skip)
     for n in range(work_cat.catsize):
-        if n in skip:
+        if n in skip_set:
             continue
         if kx is not None and work_cat.coeff[n] is not None:
             kmat = (work_cat.coeff[n], kx, ky)
@@ -333,11 +367,10 @@ def make_bg_frame(shape, work_cat, psf_ids, psfs, skip=[0], kx=None, ky=None):
                  work_cat.fscale[n],
                  work_cat.x[n],
                  work_cat.y[n],
-                 work_cat.dxs[n],
-                 work_cat.dys[n],
+                 *work_cat.offsets(n),
                  psfs[psf_ids[n]],
                  kmat=kmat,
-                 radius=radii[n])
+                 radius=work_cat.rad[n])
     return frame
 
 
@@ -348,7 +381,6 @@ def make_single_star_frame(shape, work_cat, psf_mod, star_id, kx=None, ky=None):
     star entries (those that then have coefficients defined in
     work_cat). Returns produced frame according to shape.
     """
-    radius = np.array(work_cat.rad[star_id], dtype='int')
     frame = np.zeros(shape)
     if kx is not None and work_cat.coeff[star_id] is not None:
         kmat = (work_cat.coeff[star_id], kx, ky)
@@ -359,11 +391,10 @@ def make_single_star_frame(shape, work_cat, psf_mod, star_id, kx=None, ky=None):
             work_cat.fscale[star_id],
             work_cat.x[star_id],
             work_cat.y[star_id],
-            work_cat.dxs[star_id],
-            work_cat.dys[star_id],
+            *work_cat.offsets(star_id),
             psf_mod,
             kmat=kmat,
-            radius=radius)
+            radius=work_cat.rad[star_id])
     return frame
 
 
@@ -386,7 +417,37 @@ def add_star(frame, flux, x0, y0, dxs, dys, psf_mod, kmat=None, radius=30):
         star_frame = psf_image(x0f, y0f, dxs, dys, psf_mod, radius=radius)
     else:
         star_frame = psf_fit_image(kmat[0], x0f+kmat[1], y0f+kmat[2], dxs, dys, psf_mod, radius=radius)
-    frame[yi0:yi1,xi0:xi1] += flux*star_frame[yj0:yj1, xj0:xj1]
+    add_patch(frame, star_frame[yj0:yj1, xj0:xj1], xi0, yi0, flux)
+
+
+def add_patch(frame, patch, i0, j0, flux):
+    """Adds flux*patch to frame at offset (j0, i0)
+    """
+    if _add_patch is not None:
+        return _add_patch(frame, patch, i0, j0, flux)
+    frame[j0:j0+patch.shape[0],i0:i0+patch.shape[1]] += flux * patch
+
+
+def add_masked_patch(frame, patch, i0, j0, ddx, ddy, r2, flux):
+    """Adds flux*patch to frame at offset (j0, i0), for pixels
+    within squared distance r2 of the star, where ddx and ddy are the
+    pixel coordinates of the patch relative to the star. Pixels outside
+    are ignored (also if not finite), and patch is left unchanged.
+    """
+    if _add_masked_patch is not None:
+        return _add_masked_patch(frame, patch, i0, j0, ddx, ddy, r2, flux)
+    inside = ddx[None,:]**2 + ddy[:,None]**2 <= r2
+    frame[j0:j0+patch.shape[0],i0:i0+patch.shape[1]] += flux * np.where(inside, patch, 0)
+
+
+def add_masked_columns(trail, patch, i0, j0, ddx, ddy, r2, flux):
+    """Same as add_masked_patch, but adds the column sums of the
+    masked patch to the 1D trail (j0 is not used).
+    """
+    if _add_masked_columns is not None:
+        return _add_masked_columns(trail, patch, i0, j0, ddx, ddy, r2, flux)
+    inside = ddx[None,:]**2 + ddy[:,None]**2 <= r2
+    trail[i0:i0+patch.shape[1]] += flux * np.sum(np.where(inside, patch, 0), axis=0)
 
 
 def add_psf_mask(frame, x0, y0, dxs, dys, psf_mod, kmat=None, radius=30, level=0.1):
@@ -407,33 +468,45 @@ def add_circle(frame, x0, y0, radius=20):
     x0f, y0f = x0-x0i, y0-y0i
     xi0,xi1,xj0,xj1 = find_inds(frame.shape[1], x0i, im_rad)
     yi0,yi1,yj0,yj1 = find_inds(frame.shape[0], y0i, im_rad)
-    v = np.linspace(-im_rad, im_rad, 2*im_rad+1)
-    X, Y = np.meshgrid(v-x0f, v-y0f)
-    circ_frame = (X**2 + Y**2) <= radius**2
+    v = pixel_grid(im_rad)
+    circ_frame = ((v-x0f)[None,:]**2 + (v-y0f)[:,None]**2) <= radius*radius
     frame[yi0:yi1,xi0:xi1] += circ_frame[yj0:yj1, xj0:xj1]
 
 
 
+@lru_cache(maxsize=256)
+def pixel_grid(radius):
+    """Returns the (read-only) pixel coordinates -radius to radius,
+    shared between all stars of the same PSF radius.
+    """
+    v = np.arange(-radius, radius+1, dtype=np.float64)
+    v.flags.writeable = False
+    return v
+
+
+@lru_cache(maxsize=256)
+def disc_mask(radius):
+    """Returns the (read-only) boolean disc of a PSF frame of
+    the radius, shared between all stars of the same PSF radius.
+    """
+    v = pixel_grid(radius)
+    disc = v[:,None]**2 + v[None,:]**2 <= radius**2
+    disc.flags.writeable = False
+    return disc
+
+
 def find_inds(x_len, x, radius):
     """Finds indices i0, i1, j0, j1 such that a region b
     centered on x with radius, fits in region A of length
     x_len so that x_len[i0:i1] = b[j0:j1]. Returns indices
     zero if no overlap.
     """
-    if (x < -radius) or (x > x_len + radius):
+    i0 = max(x - radius, 0)
+    i1 = min(x + radius + 1, x_len)
+    if i1 <= i0:
         return 0, 0, 0, 0
-    if x > radius:
-        i0 = x - radius
-        j0 = 0
-    else:
-        i0 = 0
-        j0 = radius - x
-    if x + radius < x_len:
-        i1 = x + radius + 1
-        j1 = 2*radius + 1
-    else:
-        i1 = x_len
-        j1 = radius - x + x_len
+    j0 = max(radius - x, 0)
+    j1 = j0 + i1 - i0
     return i0, i1, j0, j1
 
 
@@ -443,7 +516,7 @@ def psf_image(x0f, y0f, dxs, dys, psf_mod, radius=30):
     over a 2*radius+1 square frame. x0f,y0f is the 
     fractional pixel offset from centre.
     """
-    v = np.linspace(-radius, radius, int(2*radius+1))
+    v = pixel_grid(float(radius))
     psf = MultiPSF(psf_mod, dxs, dys)
     return psf(v-x0f, v-y0f, circular=True)
  
@@ -453,14 +526,13 @@ def psf_fit_image(kf, kx, ky, dxs, dys, psf_mod, radius=30):
     kf, kx, ky where kf is coefficient for offest kx,ky.
     Use PSF model psf_mod over a 2*radius+1 square frame.
     """
-    v = np.linspace(-radius, radius, 2*radius+1)
+    v = pixel_grid(float(radius))
     psf_smear = MultiPSF(psf_mod, dxs, dys)
     ret = kf[0]*psf_smear(v-kx[0], v-ky[0], circular=False)
     for n in range(1, len(kf)):
         ret += kf[n]*psf_smear(v-kx[n], v-ky[n], circular=False)
-    xx, yy = np.mgrid[-radius:(radius+1),-radius:(radius+1)]
-    disc = xx**2+yy**2 <= radius**2
-    return disc*ret
+    ret *= disc_mask(float(radius))
+    return ret
 
 
 def make_multi_psf(psf_mod, dxs, dys):
@@ -486,9 +558,10 @@ class MultiPSF():
                            grid=grid, circular=circular)
         N = len(self.dxs)
         for n in range(1,N):
-            ret += self.psf_mod(x-self.dxs[n], y-self.dys[n],
-                                grid=grid, circular=circular)
-        return ret/N
+            np.add(ret, self.psf_mod(x-self.dxs[n], y-self.dys[n],
+                                     grid=grid, circular=circular), out=ret)
+        ret /= N
+        return ret
 
 
 
@@ -514,8 +587,11 @@ def derotate_position(xroll, yroll, rolldegs):
 def find_area_inds(x, y, shape, radius):
     """Finds border indices for area in shape that is
     defined by a circle of radius at x,y (floating point)
-    pixel coordinates
+    pixel coordinates. Raises ValueError if x or y is not finite.
     """
+    # Checked explicitly, as the compiled int() does not raise
+    if not (math.isfinite(x) and math.isfinite(y)):
+        raise ValueError('area position is not finite')
     i = int(x)
     i0 = i - radius
     # Skip if further than radius outside image
@@ -533,3 +609,49 @@ def find_area_inds(x, y, shape, radius):
     j1 = min(j1, shape[0])
     return (i0, i1, j0, j1)
 
+
+_add_patch = None
+_add_masked_patch = None
+_add_masked_columns = None
+
+if njit is not None:
+    @njit(cache=True)
+    def _add_patch_jit(frame, patch, i0, j0, flux):
+        """Loops over the pixels of patch and adds them, scaled by
+        flux, to frame at offset (j0, i0).
+        """
+        for j in range(patch.shape[0]):
+            for i in range(patch.shape[1]):
+                frame[j0+j, i0+i] += flux * patch[j, i]
+
+    @njit(cache=True)
+    def _add_masked_patch_jit(frame, patch, i0, j0, ddx, ddy, r2, flux):
+        """Loops over the pixels of patch and adds those within squared
+        distance r2 of the star, scaled by flux, to frame at offset (j0, i0).
+        """
+        for j in range(patch.shape[0]):
+            dy2 = ddy[j]*ddy[j]
+            for i in range(patch.shape[1]):
+                if ddx[i]*ddx[i] + dy2 <= r2:
+                    frame[j0+j, i0+i] += flux * patch[j, i]
+
+    @njit(cache=True)
+    def _add_masked_columns_jit(trail, patch, i0, j0, ddx, ddy, r2, flux):
+        """Loops over the pixels of patch and adds those within squared
+        distance r2 of the star, scaled by flux, to their column i0+i
+        of trail.
+        """
+        for j in range(patch.shape[0]):
+            dy2 = ddy[j]*ddy[j]
+            for i in range(patch.shape[1]):
+                if ddx[i]*ddx[i] + dy2 <= r2:
+                    trail[i0+i] += flux * patch[j, i]
+
+    _add_patch = _add_patch_jit
+    _add_masked_patch = _add_masked_patch_jit
+    _add_masked_columns = _add_masked_columns_jit
+
+    # The index helpers are compiled as they are, being faster to call
+    # also from Python
+    find_inds = njit(cache=True)(find_inds)
+    find_area_inds = njit(cache=True)(find_area_inds)
@@ -0,0 +1,73 @@
+import os
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+
+from ..psf_library import (PSF_Library, psf_metric, params_from_filename,
+                           params_from_filenames)
+
+
+def make_library(path, num, seed=0):
+    """Creates num empty PSF files with random parameters in path
+    """
+    rng = np.random.default_rng(seed)
+    for n in range(num):
+        folder = os.path.join(path, '{:03d}x{:03d}'.format(*rng.integers(0, 1000, 2)))
+        os.makedirs(folder, exist_ok=True)
+        name = 'psf_{:05d}K_{:05.2f}C_{:05d}_{:04.1f}_{:04d}.npy'.format(
+            rng.integers(3000, 10000), rng.uniform(5, 20),
+            rng.integers(58000, 60000), rng.uniform(1, 60), n)
+        open(os.path.join(folder, name), 'w').close()
+
+
+def test_scores():
+    """The scores of all library entries agree with psf_metric,
+    also when computed by the compiled kernel
+    """
+    with TemporaryDirectory() as tempdir:
+        make_library(tempdir, 50)
+        lib = PSF_Library(tempdir, weights=(1e2, 1e2, 4e3, 1e4, 1.0, 1.0))
+    target = (512, 400, 5500, -12.0, 59000)
+    expected = [psf_metric(target, params, weights=lib.metric_weights)
+                for params in lib.params]
+    np.testing.assert_allclose(lib.compute_scores(target), expected, rtol=1e-12)
+
+    files, scores = lib.best_matches(target, min_num=7)
+    ind = np.argsort(expected)[:7]
+    np.testing.assert_array_equal(files, lib.files[ind])
+    np.testing.assert_allclose(scores, np.array(expected)[ind], rtol=1e-12)
+
+
+def test_filename_serial():
+    """The first free serial is used, and an error raised
+    when all serials below the limit are taken
+    """
+    with TemporaryDirectory() as tempdir:
+        lib = PSF_Library(tempdir)
+        lib.serial_limit = 3
+        params = dict(xc=291, yc=830, Teff=5690, TF2=-18.0, mjd=59323, exptime=4.4)
+
+        first = lib.filename(**params)
+        assert os.path.basename(first) == 'psf_05690K_18.00C_59323_04.4_0000.npy'
+
+        for serial in (0, 2):
+            open(first.replace('_0000.npy', '_{:04d}.npy'.format(serial)), 'w').close()
+        assert lib.filename(**params).endswith('_0001.npy')
+
+        open(first.replace('_0000.npy', '_0001.npy'), 'w').close()
+        with pytest.raises(ValueError):
+            lib.filename(**params)
+
+
+def test_params_from_filenames():
+    """Parsing all filenames at once gives the same parameters
+    as parsing them one by one
+    """
+    with TemporaryDirectory() as tempdir:
+        make_library(tempdir, 20)
+        lib = PSF_Library(tempdir)
+    expected = [params_from_filename(name) for name in lib.files]
+    np.testing.assert_array_equal(params_from_filenames(lib.files), expected)
+    np.testing.assert_array_equal(params_from_filenames(list(lib.files)), expected)
+    assert params_from_filenames([]).shape == (0, 6)
@@ -0,0 +1,141 @@
+import os
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from .. import read
+
+
+def test_raw_datacube_unsigned():
+    """Unsigned integer cubes are stored with BZERO, and must be
+    read (and scaled) also when only some frames are requested
+    """
+    cube = np.arange(4*5*6, dtype=np.uint32).reshape(4, 5, 6) + 2**31
+    cube[1, 0, 0] = 0
+    tab = fits.BinTableHDU.from_columns(
+        [fits.Column('MJD_TIME', 'D', array=59000 + np.arange(4.0))])
+    with TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, 'RAW_Imagette.fits')
+        fits.HDUList([fits.PrimaryHDU(), fits.ImageHDU(cube), tab]).writeto(filename)
+
+        rawcube, mjd, _hdr, _tab = read.raw_datacube(filename, frame_range=(1, 3))
+        assert rawcube.dtype == np.float64
+        assert np.isnan(rawcube[0, 0, 0])
+        rawcube[0, 0, 0] = 0
+        np.testing.assert_array_equal(rawcube, cube[1:3])
+        np.testing.assert_array_equal(mjd, 59000 + np.arange(1.0, 3.0))
+
+
+def test_raw_datacube_float32():
+    """Cubes can be read as float32, with the same values as float64
+    """
+    cube = np.arange(3*4*5, dtype=np.uint16).reshape(3, 4, 5) + 1
+    tab = fits.BinTableHDU.from_columns(
+        [fits.Column('MJD_TIME', 'D', array=59000 + np.arange(3.0))])
+    with TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, 'RAW_SubArray.fits')
+        fits.HDUList([fits.PrimaryHDU(), fits.ImageHDU(cube), tab]).writeto(filename)
+
+        rawcube, _mjd, _hdr, _tab = read.raw_datacube(filename, dtype=np.float32)
+        assert rawcube.dtype == np.float32
+        np.testing.assert_array_equal(rawcube, cube)
+        data, _hdr = read.fits_cube(filename, level=1, dtype=np.float32)
+        assert data.dtype == np.float32
+        np.testing.assert_array_equal(data, cube)
+
+
+@pytest.mark.parametrize('dtype, valid', [('float32', True), ('int16', False)])
+def test_pipe_dtype(dtype, valid):
+    """The default cube type is set by PIPE_DTYPE, which has to be
+    a floating point type
+    """
+    code = 'from pipe import read; assert read.DTYPE == "{}"'.format(dtype)
+    proc = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                          env=dict(os.environ, PIPE_DTYPE=dtype),
+                          cwd=os.path.dirname(os.path.dirname(read.__file__)))
+    if valid:
+        assert proc.returncode == 0, proc.stderr.decode()
+    else:
+        assert b'ValueError: PIPE_DTYPE has to be a floating' in proc.stderr
+
+
+def test_flatfield_unsorted():
+    """Flatfield layers are interpolated in temperature also when the
+    table is not sorted and contains layers of other data types
+    """
+    T = np.array([6000.0, 0.0, 4000.0, 8000.0, 5000.0])
+    types = np.array(['FLAT FIELD', 'OTHER', 'FLAT FIELD', 'FLAT FIELD', 'FLAT FIELD'])
+    level = np.array([1.0, 7.0, 3.0, 5.0, 2.0])
+    cube = np.ones((5, 10, 12), dtype=np.uint16) * (1000*level[:, None, None]).astype(np.uint16)
+    tab = fits.BinTableHDU.from_columns([fits.Column('T_EFF', 'D', array=T),
+                                         fits.Column('DATA_TYPE', '20A', array=types)])
+    with TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, 'REF_APP_FlatFieldTeff.fits')
+        fits.HDUList([fits.PrimaryHDU(), fits.ImageHDU(cube), tab]).writeto(filename)
+
+        for Teff, expected in ((4000, 3000), (4500, 2500), (5500, 1500),
+                               (7000, 3000), (8000, 5000)):
+            ff = read.flatfield(filename, Teff, offset=(2, 3), shape=(4, 5))
+            assert ff.shape == (5, 4)
+            np.testing.assert_allclose(ff, expected)
+
+
+def test_fits_cube_views():
+    """Cubes can be returned as read-only views, also for scaled data
+    """
+    cube = np.arange(3*4*5, dtype=np.uint16).reshape(3, 4, 5)
+    with TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, 'cube.fits')
+        fits.PrimaryHDU(cube).writeto(filename)
+        for copy in (True, False):
+            data, _hdr = read.fits_cube(filename, copy=copy)
+            np.testing.assert_array_equal(data, cube)
+            assert data.flags.writeable == copy
+
+
+def test_read_columns_fitsio():
+    """Table values read through fitsio are identical to those
+    read through astropy
+    """
+    pytest.importorskip('fitsio')
+    cat = fits.BinTableHDU.from_columns([
+        fits.Column('MAG_CHEOPS', 'D', array=[8.5, 9.25, 10.0]),
+        fits.Column('T_EFF', 'E', array=[5000.0, np.nan, 6000.0]),
+        fits.Column('ID', '20A', array=['Gaia 123', 'Gaia 4567', 'x'])])
+    offsets = ['X_OFF_FULL_ARRAY', 'Y_OFF_FULL_ARRAY',
+               'X_OFF_SUB_ARRAY', 'Y_OFF_SUB_ARRAY']
+    offs = fits.BinTableHDU.from_columns(
+        [fits.Column(name, 'I', bzero=32768,
+                     array=np.array([40000, 5, 6], dtype=np.uint16) + k)
+         for k, name in enumerate(offsets)] +
+        [fits.Column('COUNTER', 'J', bzero=2**31,
+                     array=np.array([3000000000, 1, 2], dtype=np.uint32))])
+
+    def read_all(filename):
+        values = [read.starcat(filename, col, entry)
+                  for col in ('MAG_CHEOPS', 'T_EFF', 'ID') for entry in (0, 2)]
+        values += [read.raw_param(filename, 1, col)
+                   for col in ('MAG_CHEOPS', 'T_EFF', 'ID')]
+        values += [read.raw_param(filename, 2, 'COUNTER')]
+        (x, y), (x_sa, y_sa) = read.imagette_offset(filename)
+        return values + [x, y, x_sa, y_sa]
+
+    with TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, 'tables.fits')
+        fits.HDUList([fits.PrimaryHDU(), cat, offs]).writeto(filename)
+        with_fitsio = read_all(filename)
+        fitsio = read.fitsio
+        try:
+            read.fitsio = None
+            with_astropy = read_all(filename)
+        finally:
+            read.fitsio = fitsio
+
+    for a, b in zip(with_fitsio, with_astropy):
+        a, b = np.asarray(a), np.asarray(b)
+        assert a.dtype == b.dtype
+        assert a.tobytes() == b.tobytes()